@@ -2,8 +2,15 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import xmltodict
 import datetime
+import hashlib
 import json
 import os
+import re
+import queue
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+from collections import Counter, OrderedDict, deque
 
 app = Flask(__name__)
 CORS(app)
@@ -16,24 +23,479 @@ last_update_time = None
 EXPORT_FOLDER = "parsed_exports"
 os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
+# Folder where precomputed dashboard aggregates are stored
+VIEWS_FOLDER = os.path.join(EXPORT_FOLDER, "views")
+os.makedirs(VIEWS_FOLDER, exist_ok=True)
 
-@app.route("/api/upload_tally_data", methods=["POST"])
-def upload_tally_data():
+
+# ---------------------------------------------------------------------------
+# Materialized views
+#
+# Each view groups the records of one collection by a field and sums a set of
+# measures. Paths are tuples of keys into the xmltodict record; the first path
+# that resolves wins, so alternatives cover the different shapes Tally emits.
+# A view with "fan_out" groups each entry of that list separately (group_by is
+# then relative to the entry). The record-level measure is shared out across
+# the entries by the first "split_by" path every entry carries (equally if
+# none), so the entries always add up to the record; records without the list
+# count as a whole.
+# ---------------------------------------------------------------------------
+MATERIALIZED_VIEWS = {
+    "stock_value_by_godown": {
+        "collection": "STOCKITEM",
+        # Stock item masters carry opening figures per godown but only the
+        # item's total closing stock, so the closing figures are split in
+        # proportion to each allocation's own (if present) or opening figures.
+        "fan_out": "BATCHALLOCATIONS.LIST",
+        "group_by": [("GODOWNNAME",)],
+        "default_group": "Main Location",
+        "measures": {
+            "closing_value": [("CLOSINGVALUE",)],
+            "closing_quantity": [("CLOSINGBALANCE",)],
+        },
+        "split_by": {
+            "closing_value": [("CLOSINGVALUE",), ("OPENINGVALUE",)],
+            "closing_quantity": [("CLOSINGBALANCE",), ("OPENINGBALANCE",)],
+        },
+    },
+    "stock_value_by_group": {
+        "collection": "STOCKITEM",
+        "group_by": [("PARENT",)],
+        "default_group": "Primary",
+        "measures": {
+            "closing_value": [("CLOSINGVALUE",)],
+            "closing_quantity": [("CLOSINGBALANCE",)],
+        },
+    },
+    "stock_value_by_unit": {
+        "collection": "STOCKITEM",
+        "group_by": [("BASEUNITS",)],
+        "default_group": "Not Applicable",
+        "measures": {
+            "closing_value": [("CLOSINGVALUE",)],
+            "closing_quantity": [("CLOSINGBALANCE",)],
+        },
+    },
+    "ledger_balance_by_group": {
+        "collection": "LEDGER",
+        "group_by": [("PARENT",)],
+        "default_group": "Primary",
+        "measures": {
+            "opening_balance": [("OPENINGBALANCE",)],
+            "closing_balance": [("CLOSINGBALANCE",)],
+        },
+    },
+}
+
+# view name -> {group: {"count": n, measure: total}}
+view_state = {name: {} for name in MATERIALIZED_VIEWS}
+# view name -> ready-to-send JSON body, rebuilt only when the view changes
+view_cache = {}
+# collection -> Counter of record fingerprints in the current snapshot
+record_fingerprints = {}
+# collection -> {fingerprint: record}, needed to subtract records that disappear
+snapshot_records = {}
+snapshot_lock = threading.Lock()
+views_lock = threading.Lock()
+# collection -> lock held while a snapshot of it is stored and applied
+collection_locks = {}
+collection_locks_lock = threading.Lock()
+
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _scalar(value):
+    """Unwrap xmltodict text nodes ({'#text': ..., '@attr': ...})."""
+    if isinstance(value, dict):
+        return value.get("#text")
+    return value
+
+
+def _resolve_path(record, path):
+    """Follow a key path through a record, taking the first item of lists."""
+    value = record
+    for key in path:
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return _scalar(value)
+
+
+def _first_value(record, paths):
+    for path in paths:
+        value = _resolve_path(record, path)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _to_number(value):
+    """Parse Tally amounts/quantities like '-1,250.00' or '12 Nos'."""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_RE.search(str(value).replace(",", ""))
+    return float(match.group()) if match else 0.0
+
+
+def _collection_lock(collection_name):
+    with collection_locks_lock:
+        return collection_locks.setdefault(collection_name, threading.Lock())
+
+
+def _fingerprint(record):
+    return hashlib.sha1(
+        json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _split(total, entries, paths):
+    """Share total across entries by the first path all of them carry."""
+    for path in paths:
+        values = [_resolve_path(entry, path) for entry in entries]
+        if all(v not in (None, "") for v in values):
+            weights = [abs(_to_number(v)) for v in values]
+            if sum(weights):
+                break
+    else:
+        weights = [1.0] * len(entries)
+    weight_sum = sum(weights)
+    shares = [total * w / weight_sum for w in weights[:-1]]
+    # The last entry takes the remainder so the shares add up exactly
+    return shares + [total - sum(shares)]
+
+
+def _view_contributions(record, view):
+    """(group, {measure: amount}) pairs one record adds to a view."""
+    totals = {
+        measure: _to_number(_first_value(record, paths))
+        for measure, paths in view["measures"].items()
+    }
+    fan_out = view.get("fan_out")
+    entries = record.get(fan_out) if fan_out else None
+    if isinstance(entries, dict):
+        entries = [entries]
+    entries = [e for e in entries or [] if isinstance(e, dict)]
+    if not entries:
+        group = _first_value(record, view["group_by"]) or view["default_group"]
+        return [(group, totals)]
+
+    shares = {
+        measure: _split(total, entries, view["split_by"].get(measure, []))
+        for measure, total in totals.items()
+    }
+    return [
+        (
+            _first_value(entry, view["group_by"]) or view["default_group"],
+            {measure: shares[measure][i] for measure in totals},
+        )
+        for i, entry in enumerate(entries)
+    ]
+
+
+def _apply_to_views(collection_name, record, sign):
+    """Add (sign=1) or remove (sign=-1) one record's contribution."""
+    changed = set()
+    for view_name, view in MATERIALIZED_VIEWS.items():
+        if view["collection"] != collection_name:
+            continue
+        groups = view_state[view_name]
+        for group, amounts in _view_contributions(record, view):
+            row = groups.setdefault(group, {"count": 0, **{m: 0.0 for m in view["measures"]}})
+            row["count"] += sign
+            for measure, amount in amounts.items():
+                row[measure] += sign * amount
+            if row["count"] <= 0:
+                del groups[group]
+        changed.add(view_name)
+    return changed
+
+
+def _render_view(view_name):
+    view = MATERIALIZED_VIEWS[view_name]
+    rows = [
+        {"group": group, **{k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()}}
+        for group, row in sorted(view_state[view_name].items())
+    ]
+    return json.dumps({
+        "view": view_name,
+        "collection": view["collection"],
+        "rows": rows,
+        "last_update": datetime.datetime.now().isoformat(),
+    }, ensure_ascii=False)
+
+
+def diff_snapshot(collection_name, data_items):
     """
-    Receives raw XML from xmlRead2.py, converts to JSON,
-    stores in memory AND saves to disk.
+    Compare a new snapshot of a collection with the previous one by record
+    fingerprint. Returns (fingerprints, removed, added): the fingerprint of
+    every record in order, and the records that left or joined the
+    collection. Unchanged records cost a hash and nothing more.
     """
-    global inventory_data_by_collection, last_update_time
+    fingerprints = []
+    new_records = {}
+    new_counts = Counter()
+    for record in data_items:
+        fp = _fingerprint(record)
+        fingerprints.append(fp)
+        new_records.setdefault(fp, record)
+        new_counts[fp] += 1
 
-    raw_xml = request.data
-    if not raw_xml:
-        return jsonify({"status": "error", "message": "Empty request"}), 400
+    with snapshot_lock:
+        old_counts = record_fingerprints.get(collection_name, Counter())
+        old_records = snapshot_records.get(collection_name, {})
+        removed = [(fp, old_records[fp]) for fp, n in (old_counts - new_counts).items() for _ in range(n)]
+        added = [(fp, new_records[fp]) for fp, n in (new_counts - old_counts).items() for _ in range(n)]
+        record_fingerprints[collection_name] = new_counts
+        snapshot_records[collection_name] = new_records
+
+    return fingerprints, removed, added
+
+
+def update_views(collection_name, removed, added):
+    """Apply the records that changed since the last snapshot to the views."""
+    if not any(v["collection"] == collection_name for v in MATERIALIZED_VIEWS.values()):
+        return
+
+    with views_lock:
+        changed = set()
+        for _, record in removed:
+            changed |= _apply_to_views(collection_name, record, -1)
+        for _, record in added:
+            changed |= _apply_to_views(collection_name, record, 1)
+
+        for view_name in changed:
+            body = _render_view(view_name)
+            view_cache[view_name] = body
+            with open(os.path.join(VIEWS_FOLDER, f"{view_name}.json"), "w", encoding="utf-8") as f:
+                f.write(body)
+
+    if changed:
+        print(f"📊 Updated views: {', '.join(sorted(changed))}")
+
+
+# ---------------------------------------------------------------------------
+# Column schema
+#
+# Records are flattened into table columns ("PARENT", "@NAME",
+# "BATCHALLOCATIONS.LIST.GODOWNNAME") and each value is typed once when it
+# is ingested. Quantities and rates with a unit (" 12 Nos", "100.00/Nos")
+# become a number plus a "<column>:UNIT" column. Per-column type counts are
+# kept so that a snapshot only has to account for the records that changed.
+# ---------------------------------------------------------------------------
+STRICT_NUMBER_RE = re.compile(r"^-?(\d{1,3}(,\d{3})+|\d+)?(\.\d+)?$")
+UNIT_NUMBER_RE = re.compile(r"^(-?[\d,]*\.?\d+)(?:\s+|\s*/\s*)([A-Za-z][A-Za-z0-9.]*)$")
+TALLY_DATE_RE = re.compile(r"^\d{8}$")
+TALLY_DATE_FORMATS = ("%d-%b-%Y", "%d-%b-%y")
+
+# collection -> {column: Counter({type: n})}
+column_type_counts = {}
+# collection -> {"version": n, "columns": [...], ...}
+collection_schemas = {}
+# collection -> JSON array of flattened rows with coerced values, serialized
+# once per snapshot and spliced into /api/get_processed_data responses
+processed_rows_json = {}
+# collection -> {fingerprint: {column: (type, coerced value, raw text)}}
+flattened_cache = {}
+# ready-to-send body for /api/get_processed_columns
+processed_columns_cache = None
+schema_lock = threading.Lock()
+
+
+def _flatten(value, prefix, out):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key == "#text":
+                _flatten(child, prefix, out)
+            else:
+                _flatten(child, f"{prefix}.{key}" if prefix else key, out)
+    elif isinstance(value, list):
+        # Repeated elements share a column; their values are joined
+        parts = {}
+        for item in value:
+            _flatten(item, prefix, parts)
+        for key, part in parts.items():
+            out[key] = part if key not in out else f"{out[key]}, {part}"
+    elif value is not None and prefix:
+        text = str(value).strip()
+        out[prefix] = text if prefix not in out else f"{out[prefix]}, {text}"
+
+
+def _coerce(column, text):
+    """Return (type, value) for one raw string."""
+    if text == "":
+        return "empty", ""
+    if text in ("Yes", "No"):
+        return "boolean", text == "Yes"
+    if "DATE" in column.upper():
+        if TALLY_DATE_RE.match(text):
+            try:
+                return "date", datetime.datetime.strptime(text, "%Y%m%d").date().isoformat()
+            except ValueError:
+                pass
+        for fmt in TALLY_DATE_FORMATS:
+            try:
+                return "date", datetime.datetime.strptime(text, fmt).date().isoformat()
+            except ValueError:
+                pass
+    if STRICT_NUMBER_RE.match(text) and any(c.isdigit() for c in text):
+        digits = text.replace(",", "").lstrip("-")
+        # Codes (PIN, phone, account, part numbers) must keep their exact text
+        leading_zero = len(digits) > 1 and digits[0] == "0" and digits[1] != "."
+        significant = len(digits.replace(".", "").lstrip("0"))
+        if not leading_zero and significant <= 15:
+            if "." in text:
+                return "number", float(text.replace(",", ""))
+            return "number", int(text.replace(",", ""))
+    return "string", text
+
+
+def _flatten_record(cache, fp, record):
+    cached = cache.get(fp)
+    if cached is None:
+        flat = {}
+        _flatten(record, "", flat)
+        cached = {}
+        for column, text in flat.items():
+            kind, value = _coerce(column, text)
+            cached[column] = (kind, value, text)
+            match = UNIT_NUMBER_RE.match(text) if kind == "string" else None
+            if match:
+                kind, value = _coerce(column, match.group(1))
+                if kind == "number":
+                    unit = match.group(2)
+                    cached[column] = (kind, value, text)
+                    cached[f"{column}:UNIT"] = ("string", unit, unit)
+        cache[fp] = cached
+    return cached
+
+
+def _column_type(counts):
+    kinds = [kind for kind, n in counts.items() if n > 0 and kind != "empty"]
+    if not kinds:
+        return "string"
+    return kinds[0] if len(kinds) == 1 else "string"
+
+
+def _column_name(column):
+    return column.replace(".LIST", "").replace("@", "").replace(":UNIT", " UNIT")
+
+
+def _column_names(column_ids):
+    """
+    Unique display names. Elements claim the short name before attributes,
+    so "@NAME" next to "NAME" keeps its "@"; other clashes fall back to the
+    full id and then a counter.
+    """
+    names, used = {}, set()
+    for column in sorted(column_ids, key=lambda c: "@" in c):
+        name = _column_name(column)
+        if name in used:
+            name = column.replace(".LIST", "").replace(":UNIT", " UNIT")
+        if name in used:
+            name = column
+        base, n = name, 2
+        while name in used:
+            name, n = f"{base} ({n})", n + 1
+        used.add(name)
+        names[column] = name
+    return names
+
+
+def _load_saved_schema(collection_name):
+    """Schema saved by an earlier run, so versions keep counting up."""
+    try:
+        with open(f"{EXPORT_FOLDER}/{collection_name}.schema.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_schema(collection_name, fingerprints, removed, added):
+    """
+    Keep the collection's column schema and typed rows in step with the
+    latest snapshot, then save both next to the raw JSON.
+    """
+    global processed_columns_cache
+
+    with schema_lock:
+        counts = column_type_counts.setdefault(collection_name, {})
+        cache = flattened_cache.setdefault(collection_name, {})
+        for sign, records in ((-1, removed), (1, added)):
+            for fp, record in records:
+                for column, (kind, _, _) in _flatten_record(cache, fp, record).items():
+                    counts.setdefault(column, Counter())[kind] += sign
+        for column in [c for c, kinds in counts.items() if sum(kinds.values()) <= 0]:
+            del counts[column]
+
+        names = _column_names(counts)
+        columns = [
+            {"id": column, "name": names[column], "type": _column_type(kinds)}
+            for column, kinds in counts.items()
+        ]
+        types = {col["id"]: col["type"] for col in columns}
+
+        # Values keep their coerced form only where the whole column agrees
+        rows = []
+        for fp in fingerprints:
+            row = {}
+            for column, (kind, value, text) in cache[fp].items():
+                row[column] = value if kind == types[column] else text
+            rows.append(row)
+
+        previous = collection_schemas.get(collection_name) or _load_saved_schema(collection_name)
+        version = previous["version"] if previous else 0
+        if previous is None or previous["columns"] != columns:
+            version += 1
+
+        schema = {
+            "collection": collection_name,
+            "version": version,
+            "records": len(rows),
+            "columns": columns,
+            "updated_at": datetime.datetime.now().isoformat(),
+        }
+        rows_json = json.dumps(rows, ensure_ascii=False)
+        collection_schemas[collection_name] = schema
+        processed_rows_json[collection_name] = rows_json
+
+        # Drop flattenings of records that left the collection
+        live = record_fingerprints[collection_name]
+        for fp, _ in removed:
+            if fp not in live:
+                cache.pop(fp, None)
+
+        processed_columns_cache = json.dumps(
+            {name: sch["columns"] for name, sch in collection_schemas.items()},
+            ensure_ascii=False,
+        )
+
+    with open(f"{EXPORT_FOLDER}/{collection_name}.schema.json", "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+    with open(f"{EXPORT_FOLDER}/{collection_name}.rows.json", "w", encoding="utf-8") as f:
+        f.write(f'{{"schema_version": {version}, "rows": {rows_json}}}')
+
+    print(f"🧩 Schema v{version} for {collection_name}: {len(columns)} columns")
+
+
+def process_tally_xml(raw_xml):
+    """
+    Converts raw Tally XML to JSON, stores it in memory, saves it to disk
+    and refreshes the views. Returns the result dict; raises ValueError
+    with a user-facing message when the XML is unusable.
+    """
+    global inventory_data_by_collection, last_update_time
 
     # Parse XML → Python dict
     try:
         parsed = xmltodict.parse(raw_xml.decode("utf-8"))
     except Exception as e:
-        return jsonify({"status": "error", "message": f"XML parse failed: {str(e)}"}), 400
+        raise ValueError(f"XML parse failed: {str(e)}")
 
     # Extract collection + records
     collection_name = "UnknownCollection"
@@ -47,28 +509,317 @@ def upload_tally_data():
                 data_items = value if isinstance(value, list) else [value]
                 break
     except:
-        return jsonify({"status": "error", "message": "Invalid Tally XML"}), 400
+        raise ValueError("Invalid Tally XML")
 
     if not data_items:
-        return jsonify({"status": "error", "message": "No records found"}), 400
+        raise ValueError("No records found")
 
-    # Update RAM mirror (for debug UI)
-    inventory_data_by_collection[collection_name] = data_items
-    last_update_time = datetime.datetime.now()
+    # Two uploads of one collection can reach here at once (e.g. when the
+    # collection could not be sniffed before queueing); each must be stored
+    # and diffed as a whole before the next one starts
+    with _collection_lock(collection_name):
+        # Update RAM mirror (for debug UI)
+        inventory_data_by_collection[collection_name] = data_items
+        last_update_time = datetime.datetime.now()
 
-    # ✅ Save parsed JSON to disk
-    file_path = f"{EXPORT_FOLDER}/{collection_name}.json"
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data_items, f, indent=2)
+        # ✅ Save parsed JSON to disk
+        file_path = f"{EXPORT_FOLDER}/{collection_name}.json"
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(data_items, f, indent=2)
 
-    print(f"💾 Saved {len(data_items)} records → {file_path}")
+        print(f"💾 Saved {len(data_items)} records → {file_path}")
 
-    return jsonify({
-        "status": "success",
+        refresh_derived_data(collection_name, data_items)
+
+    return {
         "collection": collection_name,
         "records_saved": len(data_items),
         "file": file_path
-    }), 200
+    }
+
+
+def refresh_derived_data(collection_name, data_items):
+    """Update views and column schema for a new snapshot of a collection."""
+    try:
+        fingerprints, removed, added = diff_snapshot(collection_name, data_items)
+        update_views(collection_name, removed, added)
+        update_schema(collection_name, fingerprints, removed, added)
+    except Exception:
+        # The fingerprints already moved on, so the views and schema would
+        # never see this diff; start the collection over instead
+        _reset_derived_data(collection_name)
+        raise
+
+
+def _reset_derived_data(collection_name):
+    """
+    Forget everything derived from a collection, so its next snapshot is
+    applied in full rather than diffed against a state it never reached.
+    """
+    with snapshot_lock:
+        record_fingerprints.pop(collection_name, None)
+        snapshot_records.pop(collection_name, None)
+    with views_lock:
+        for view_name, view in MATERIALIZED_VIEWS.items():
+            if view["collection"] == collection_name:
+                view_state[view_name] = {}
+                view_cache.pop(view_name, None)
+    with schema_lock:
+        column_type_counts.pop(collection_name, None)
+        flattened_cache.pop(collection_name, None)
+        processed_rows_json.pop(collection_name, None)
+    print(f"⚠️ Reset views and schema for {collection_name}; next upload rebuilds them")
+
+
+def restore_saved_exports():
+    """
+    Reload the collections saved by earlier runs, so views, schemas and the
+    snapshot fingerprints are ready before the first upload arrives.
+    """
+    global last_update_time
+
+    for file_name in sorted(os.listdir(EXPORT_FOLDER)):
+        collection_name, ext = os.path.splitext(file_name)
+        # Skip <Collection>.schema.json / <Collection>.rows.json
+        if ext != ".json" or "." in collection_name:
+            continue
+        file_path = os.path.join(EXPORT_FOLDER, file_name)
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                data_items = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not restore {file_path}: {e}")
+            continue
+        if not isinstance(data_items, list) or not data_items:
+            continue
+
+        saved_at = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
+        with _collection_lock(collection_name):
+            inventory_data_by_collection[collection_name] = data_items
+            if last_update_time is None or saved_at > last_update_time:
+                last_update_time = saved_at
+            refresh_derived_data(collection_name, data_items)
+        print(f"♻️ Restored {len(data_items)} records for {collection_name}")
+
+
+restore_saved_exports()
+
+
+# ---------------------------------------------------------------------------
+# Ingest queue
+#
+# Uploads are spooled to disk and processed by a small pool of workers, so a
+# burst of large uploads cannot pile up in memory or block the read
+# endpoints. Only one job per collection waits in the queue: a newer snapshot
+# replaces an older one that has not started yet.
+# ---------------------------------------------------------------------------
+SPOOL_FOLDER = "upload_spool"
+os.makedirs(SPOOL_FOLDER, exist_ok=True)
+
+# Jobs do not survive a restart, so leftover spool files are orphans
+for _name in os.listdir(SPOOL_FOLDER):
+    _path = os.path.join(SPOOL_FOLDER, _name)
+    if os.path.isfile(_path):
+        os.remove(_path)
+
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+INGEST_WORKERS = 2
+MAX_QUEUED_JOBS = 16       # queued jobs plus uploads still being received
+RETRY_AFTER_SECONDS = 30
+MAX_FINISHED_JOBS = 500
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+ingest_jobs = OrderedDict()     # job id -> status dict
+pending_by_collection = {}      # collection -> job id waiting in the queue
+active_collections = set()      # collections a worker is processing right now
+spooling_uploads = 0            # uploads whose body is still being received
+finished_job_ids = deque()
+ingest_queue = queue.Queue()    # collection names with a pending job
+ingest_lock = threading.Lock()
+
+
+def _peek_collection_name(spool_path):
+    """
+    Read just far enough into the spooled XML to find the collection tag,
+    so uploads can be coalesced without parsing the whole document.
+    """
+    depth_path = []
+    try:
+        for event, elem in ET.iterparse(spool_path, events=("start", "end")):
+            if event == "start":
+                if depth_path[-4:] == ["ENVELOPE", "BODY", "DATA", "COLLECTION"] and elem.tag.isupper():
+                    return elem.tag
+                depth_path.append(elem.tag)
+            else:
+                depth_path.pop()
+                elem.clear()
+    except ET.ParseError:
+        pass
+    return "UnknownCollection"
+
+
+def _finish_job(job_id, **fields):
+    """Record a job's final state and forget the oldest finished jobs."""
+    with ingest_lock:
+        ingest_jobs[job_id].update(fields, finished_at=datetime.datetime.now().isoformat())
+        finished_job_ids.append(job_id)
+        while len(finished_job_ids) > MAX_FINISHED_JOBS:
+            ingest_jobs.pop(finished_job_ids.popleft(), None)
+
+
+def _ingest_worker():
+    while True:
+        queue_key = ingest_queue.get()
+        with ingest_lock:
+            job_id = pending_by_collection.pop(queue_key, None)
+            if job_id:
+                active_collections.add(queue_key)
+                ingest_jobs[job_id]["status"] = "processing"
+                spool_path = ingest_jobs[job_id]["spool_path"]
+        if not job_id:
+            ingest_queue.task_done()
+            continue
+
+        try:
+            with open(spool_path, "rb") as f:
+                result = process_tally_xml(f.read())
+            _finish_job(job_id, status="done", result=result)
+        except ValueError as e:
+            _finish_job(job_id, status="failed", message=str(e))
+        except Exception as e:
+            print(f"❌ Ingest job {job_id} crashed: {e}")
+            _finish_job(job_id, status="failed", message=f"Processing error: {str(e)}")
+        finally:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+            # A newer snapshot that arrived meanwhile was held back so the
+            # same collection is never processed twice at once
+            with ingest_lock:
+                active_collections.discard(queue_key)
+                if queue_key in pending_by_collection:
+                    ingest_queue.put(queue_key)
+            ingest_queue.task_done()
+
+
+for _ in range(INGEST_WORKERS):
+    threading.Thread(target=_ingest_worker, daemon=True).start()
+
+
+def _busy_response():
+    response = jsonify({
+        "status": "busy",
+        "message": "Ingest queue is full, retry later",
+        "retry_after": RETRY_AFTER_SECONDS
+    })
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response, 429
+
+
+def _job_view(job_id):
+    job = ingest_jobs[job_id]
+    return {"job_id": job_id, **{k: v for k, v in job.items() if k != "spool_path"}}
+
+
+@app.route("/api/upload_tally_data", methods=["POST"])
+def upload_tally_data():
+    """
+    Receives raw XML from xmlRead2.py, spools it to disk and queues it for
+    processing. Returns 202 with a job id, or 429 when the queue is full.
+    """
+    global spooling_uploads
+
+    # Decide before reading the body, so a busy server does not receive
+    # uploads it is going to reject. Agents name the collection in a header;
+    # an upload that will replace a queued one never needs a new slot.
+    hint = request.headers.get("X-Tally-Collection", "").upper()
+    with ingest_lock:
+        if hint not in pending_by_collection and \
+                len(pending_by_collection) + spooling_uploads >= MAX_QUEUED_JOBS:
+            return _busy_response()
+        spooling_uploads += 1
+
+    job_id = uuid.uuid4().hex
+    spool_path = os.path.join(SPOOL_FOLDER, f"{job_id}.xml")
+
+    # Stream the body to disk instead of holding it in memory
+    size = 0
+    try:
+        with open(spool_path, "wb") as f:
+            while True:
+                chunk = request.stream.read(64 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                f.write(chunk)
+    except BaseException:
+        # Oversized body or dropped client: don't leave a half-written spool
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        raise
+    finally:
+        with ingest_lock:
+            spooling_uploads -= 1
+
+    if size == 0:
+        os.remove(spool_path)
+        return jsonify({"status": "error", "message": "Empty request"}), 400
+
+    collection_name = _peek_collection_name(spool_path)
+    # Uploads whose collection could not be sniffed are never coalesced
+    queue_key = collection_name if collection_name != "UnknownCollection" else job_id
+
+    with ingest_lock:
+        superseded = pending_by_collection.get(queue_key)
+        if superseded is None and len(pending_by_collection) >= MAX_QUEUED_JOBS:
+            os.remove(spool_path)
+            return _busy_response()
+
+        ingest_jobs[job_id] = {
+            "status": "queued",
+            "collection": collection_name,
+            "bytes": size,
+            "submitted_at": datetime.datetime.now().isoformat(),
+            "spool_path": spool_path,
+        }
+        pending_by_collection[queue_key] = job_id
+
+        if superseded is not None:
+            old_job = ingest_jobs[superseded]
+            old_job["status"] = "superseded"
+            old_job["superseded_by"] = job_id
+            old_job["finished_at"] = datetime.datetime.now().isoformat()
+            if os.path.exists(old_job["spool_path"]):
+                os.remove(old_job["spool_path"])
+            finished_job_ids.append(superseded)
+        elif queue_key not in active_collections:
+            ingest_queue.put(queue_key)
+
+    print(f"📥 Queued {collection_name} ({size} bytes) as job {job_id}")
+
+    return jsonify({
+        "status": "accepted",
+        "job_id": job_id,
+        "collection": collection_name,
+        "status_url": f"/api/jobs/{job_id}"
+    }), 202
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        "status": "error",
+        "message": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+    }), 413
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """Report the state of an ingest job."""
+    with ingest_lock:
+        if job_id not in ingest_jobs:
+            return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+        return jsonify(_job_view(job_id))
 
 
 @app.route("/api/get_latest_data", methods=["GET"])
@@ -80,6 +831,65 @@ def get_latest_data():
     })
 
 
+@app.route("/api/get_processed_columns", methods=["GET"])
+def get_processed_columns():
+    """Return the cached column schema of every collection."""
+    return app.response_class(processed_columns_cache or "{}", mimetype="application/json")
+
+
+@app.route("/api/get_processed_data", methods=["GET"])
+def get_processed_data():
+    """
+    Return flattened, typed rows that line up with get_processed_columns,
+    for every collection or just ?collection=NAME. The rows of each
+    collection are pre-serialized, so this only joins strings.
+    """
+    wanted = request.args.get("collection")
+    with schema_lock:
+        names = [wanted] if wanted else list(processed_rows_json)
+        fragments = {n: processed_rows_json[n] for n in names if n in processed_rows_json}
+        versions = {n: collection_schemas[n]["version"] for n in fragments}
+    if wanted and not fragments:
+        return jsonify({"status": "error", "message": f"Unknown collection: {wanted}"}), 404
+
+    data = ", ".join(f"{json.dumps(name)}: {rows}" for name, rows in fragments.items())
+    body = (
+        f'{{"data": {{{data}}}, '
+        f'"schema_versions": {json.dumps(versions)}, '
+        f'"last_update": {json.dumps(last_update_time.isoformat() if last_update_time else None)}}}'
+    )
+    return app.response_class(body, mimetype="application/json")
+
+
+@app.route("/api/views", methods=["GET"])
+def list_views():
+    """List the available precomputed aggregates."""
+    return jsonify({
+        name: {
+            "collection": view["collection"],
+            "ready": name in view_cache,
+        }
+        for name, view in MATERIALIZED_VIEWS.items()
+    })
+
+
+@app.route("/api/views/<view_name>", methods=["GET"])
+def get_view(view_name):
+    """Serve a precomputed aggregate as-is; nothing is computed per request."""
+    if view_name not in MATERIALIZED_VIEWS:
+        return jsonify({"status": "error", "message": f"Unknown view: {view_name}"}), 404
+
+    body = view_cache.get(view_name)
+    if body is None:
+        return jsonify({
+            "view": view_name,
+            "collection": MATERIALIZED_VIEWS[view_name]["collection"],
+            "rows": [],
+            "last_update": None,
+        })
+    return app.response_class(body, mimetype="application/json")
+
+
 if __name__ == "__main__":
     print("🚀 Tally Local Sync Receiver Running on Port 6000")
     print("Waiting for xmlRead2.py to POST data...")
@@ -3,7 +3,7 @@
 import React, { useState, useEffect } from 'react';
 
 // Update API URLs to match your Flask backend endpoints
-const API_URL = 'http://localhost:5000/api/get_latest_data';
+const API_URL = 'http://localhost:5000/api/get_processed_data';
 const COLUMNS_API_URL = 'http://localhost:5000/api/get_processed_columns';
 
 // Optional: Mapping for more user-friendly table titles
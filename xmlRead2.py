@@ -102,12 +102,20 @@ def extract_and_save_data(xml_text, collection_name):
         print(f"❌ XML Parse Error for {collection_name}: {e}")
 
 # Function to send data to Flask
-def send_data_to_flask(xml_text, collection_name):
-    headers = {"Content-Type": "text/xml"}
+def send_data_to_flask(xml_text, collection_name, max_retries=3):
+    # The collection header lets Flask refuse a busy upload without reading the body
+    headers = {"Content-Type": "text/xml", "X-Tally-Collection": collection_name}
     try:
         print(f" Sending data for {collection_name} to Flask at {FLASK_APP_URL}...")
-        # Send the XML text as the request body
-        res = requests.post(FLASK_APP_URL, data=xml_text, headers=headers, timeout=10)
+        for attempt in range(max_retries + 1):
+            # Send the XML text as the request body
+            res = requests.post(FLASK_APP_URL, data=xml_text, headers=headers, timeout=10)
+            if res.status_code != 429 or attempt == max_retries:
+                break
+            # Backend ingest queue is full, wait as long as it asks
+            wait = int(res.headers.get("Retry-After", 30))
+            print(f" Flask is busy, retrying {collection_name} in {wait}s...")
+            time.sleep(wait)
         res.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
         print(f" Successfully sent data for {collection_name} to Flask. Response: {res.text}")
     except requests.exceptions.RequestException as e: